@@ -1,7 +1,8 @@
 import pandas as pd
-from snowflake.connector.pandas_tools import write_pandas
+from openpyxl import load_workbook
 import snowflake.connector
 import os
+from tempfile import TemporaryDirectory
 from dotenv import load_dotenv
 import sys
 
@@ -22,22 +23,81 @@ SNOWFLAKE_SCHEMA = "RAW_DATA"
 FILE_PATH = os.path.join('data', 'Online Retail.xlsx')
 RAW_TABLE_NAME = "RAW_RETAIL_SALES"
 
+# Explicit source column types, applied by the parser so no astype passes are needed afterwards
+SOURCE_DTYPES = {'InvoiceNo': 'string', 'StockCode': 'string', 'CustomerID': 'Int32'}
+SOURCE_DATE_COLUMNS = ['InvoiceDate']
+
+# --- Bulk Load Details ---
+STAGE_NAME = f"{RAW_TABLE_NAME}_STAGE"
+FILE_FORMAT_NAME = f"{RAW_TABLE_NAME}_PARQUET_FORMAT"
+PARQUET_CHUNK_SIZE = 100_000  # Rows per Parquet file, small enough to give the parallel PUT several files
+PUT_PARALLEL = 8  # Threads used by PUT to upload the files
+
 
 def clean_column_names(df):
     """Cleans DataFrame column names for Snowflake compatibility."""
-    cols = df.columns
-    new_cols = [c.upper().replace(' ', '_') for c in cols]
-    df.columns = new_cols
+    df.columns = df.columns.str.upper().str.replace(' ', '_', regex=False)
     return df
 
 
+def read_source_file(file_path):
+    """Reads the source workbook with a streaming parser instead of openpyxl's default full load."""
+    try:
+        return pd.read_excel(file_path, engine='calamine', dtype=SOURCE_DTYPES, parse_dates=SOURCE_DATE_COLUMNS)
+    except ImportError:
+        # python-calamine is not installed, so stream the rows through openpyxl's read-only mode
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows)
+            df = pd.DataFrame.from_records(list(rows), columns=header)
+        finally:
+            workbook.close()
+        for col in SOURCE_DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col])
+        return df.astype(SOURCE_DTYPES)
+
+
+def load_via_parquet(conn, df, table_name):
+    """Loads a DataFrame with one PUT of Parquet files followed by COPY INTO. Returns the rows loaded."""
+    cursor = conn.cursor()
+    with TemporaryDirectory() as tmp_dir:
+        for i, start in enumerate(range(0, len(df), PARQUET_CHUNK_SIZE)):
+            chunk = df.iloc[start:start + PARQUET_CHUNK_SIZE]
+            chunk.to_parquet(os.path.join(tmp_dir, f"chunk_{i}.parquet"), compression='snappy', index=False)
+
+        cursor.execute(f"CREATE OR REPLACE TEMPORARY STAGE {STAGE_NAME}")
+        cursor.execute(f"CREATE OR REPLACE TEMPORARY FILE FORMAT {FILE_FORMAT_NAME} "
+                       f"TYPE = PARQUET USE_LOGICAL_TYPE = TRUE")
+
+        # A single glob PUT uploads every chunk in parallel (PUT needs forward slashes, even on Windows)
+        put_path = tmp_dir.replace('\\', '/')
+        cursor.execute(f"PUT 'file://{put_path}/*' @{STAGE_NAME} PARALLEL={PUT_PARALLEL} AUTO_COMPRESS=FALSE")
+
+    # Create the table from the schema of the staged files, replacing it if it already exists
+    cursor.execute(f"""
+        CREATE OR REPLACE TABLE {table_name} USING TEMPLATE (
+            SELECT ARRAY_AGG(OBJECT_CONSTRUCT(*))
+            FROM TABLE(INFER_SCHEMA(LOCATION => '@{STAGE_NAME}', FILE_FORMAT => '{FILE_FORMAT_NAME}'))
+        )
+    """)
+    cursor.execute(f"""
+        COPY INTO {table_name}
+        FROM @{STAGE_NAME}
+        FILE_FORMAT = (FORMAT_NAME = '{FILE_FORMAT_NAME}')
+        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+    """)
+    # COPY INTO returns one row per file; the 4th column is rows_loaded
+    return sum(row[3] for row in cursor.fetchall())
+
+
 def main():
     print("Starting ELT process...")
 
     # --- EXTRACT ---
     print(f"1. Extracting data from {FILE_PATH}...")
     try:
-        df = pd.read_excel(FILE_PATH)
+        df = read_source_file(FILE_PATH)
     except FileNotFoundError:
         print(f"Error: The file was not found at {FILE_PATH}")
         print("Please make sure the 'Online Retail.xlsx' file is in the 'data' directory.")
@@ -51,13 +111,9 @@ def main():
     # Clean column names to be database-friendly
     df = clean_column_names(df)
     # Remove rows where CustomerID is null, as they are not useful for customer analytics
+    # Column types were already set when reading the file (see SOURCE_DTYPES)
     df.dropna(subset=['CUSTOMERID'], inplace=True)
 
-    # Convert columns to their correct, explicit types
-    df['INVOICENO'] = df['INVOICENO'].astype(str)
-    df['STOCKCODE'] = df['STOCKCODE'].astype(str)
-    df['CUSTOMERID'] = df['CUSTOMERID'].astype(int)
-
     print(f"   - {len(df)} rows remaining after cleaning.")
 
     # --- LOAD ---
@@ -73,15 +129,9 @@ def main():
         ) as conn:
             print("   - Snowflake connection successful.")
 
-            # Use write_pandas to efficiently load the DataFrame
-            # It handles table creation and data insertion
-            success, nchunks, nrows, _ = write_pandas(
-                conn,
-                df,
-                table_name=RAW_TABLE_NAME,
-                auto_create_table=True,  # Automatically create the table
-                overwrite=True  # Overwrite the table if it already exists
-            )
+            # Stage the DataFrame as Parquet and bulk load it with COPY INTO
+            # The table is (re)created from the schema of the staged files
+            nrows = load_via_parquet(conn, df, RAW_TABLE_NAME)
             print(f"   - Successfully loaded {nrows} rows into '{RAW_TABLE_NAME}'.")
 
     except Exception as e:
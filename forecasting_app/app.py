@@ -3,8 +3,8 @@
 import streamlit as st
 import joblib
 import pandas as pd
+import numpy as np
 from datetime import timedelta
-import altair as alt
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -12,6 +12,9 @@ st.set_page_config(
     layout="wide"
 )
 
+MODEL_FILE_PATH = "sarima_model.pkl"
+CHART_HISTORY_DAYS = 90  # Days of history shown before the forecast
+
 
 # ==============================================================================
 # DATA LOADING (Done ONCE for the whole app)
@@ -20,6 +23,7 @@ st.set_page_config(
 def load_model(model_path):
     """Loads the saved SARIMA model."""
     try:
+        # joblib detects the compression itself; mmap_mode is not used since it does not apply to compressed files
         model = joblib.load(model_path)
         return model
     except FileNotFoundError:
@@ -27,18 +31,46 @@ def load_model(model_path):
         return None
 
 
+@st.cache_data
+def build_historical(model_path):
+    """Builds the historical daily sales stored in the model as a DataFrame.
+
+    Also returns the (already sorted) dates as a datetime64[D] array, used to slice date ranges with searchsorted,
+    and the sales of the last CHART_HISTORY_DAYS days indexed by date, shown next to the forecast.
+    """
+    model = load_model(model_path)
+    history = pd.Series(
+        model.model.endog.flatten(),
+        index=model.model.data.dates,
+        name="TOTAL_PRICE"
+    ).rename_axis('INVOICE_TIMESTAMP').reset_index()
+    history_days = history['INVOICE_TIMESTAMP'].values.astype('datetime64[D]')
+    recent_sales = history.tail(CHART_HISTORY_DAYS).set_index('INVOICE_TIMESTAMP')['TOTAL_PRICE']
+    return history, history_days, recent_sales
+
+
+@st.cache_data
+def build_forecast(model_path, steps):
+    """Forecasts the next `steps` days of sales. Cached, so repeated slider values are not recomputed."""
+    model = load_model(model_path)
+    last_date = model.model.data.dates[-1]
+    forecast = model.get_forecast(steps=steps)
+    return pd.DataFrame({
+        'date': pd.date_range(start=last_date + timedelta(days=1), periods=steps),
+        'predicted_sales': forecast.predicted_mean
+    }).set_index('date')
+
+
 # Load the model which contains our data
-model_results = load_model("sarima_model.pkl")
+model_results = load_model(MODEL_FILE_PATH)
 
-# Prepare the historical data from the model for both tabs
+# Prepare the historical data from the model for both tabs (cached, so not rebuilt on every rerun)
 if model_results:
-    historical_data = pd.Series(
-        model_results.model.endog.flatten(),
-        index=model_results.model.data.dates,
-        name="TOTAL_PRICE"
-    ).reset_index().rename(columns={'index': 'INVOICE_TIMESTAMP'})
+    historical_data, historical_days, recent_sales = build_historical(MODEL_FILE_PATH)
 else:
     historical_data = pd.DataFrame()
+    historical_days = np.array([], dtype='datetime64[D]')
+    recent_sales = pd.Series(dtype=float)
 
 st.markdown("<h1 style='text-align: center;'>LookAhead - Sales Forecaster</h1>", unsafe_allow_html=True)
 st.markdown("""
@@ -82,23 +114,18 @@ with tab1:
         )
         if st.sidebar.button("Generate Forecast"):
             with st.spinner("Generating forecast..."):
-                last_date = model_results.model.data.dates[-1]
-                forecast = model_results.get_forecast(steps=forecast_days)
-                forecast_df = pd.DataFrame({
-                    'date': pd.date_range(start=last_date + timedelta(days=1), periods=forecast_days),
-                    'predicted_sales': forecast.predicted_mean
-                }).set_index('date')
+                forecast_df = build_forecast(MODEL_FILE_PATH, forecast_days)
 
                 st.subheader(f"Sales Forecast for the Next {forecast_days} Days")
 
-                # We use the pre-loaded historical data
-                chart_data = historical_data.set_index('INVOICE_TIMESTAMP')
-                st.line_chart(pd.concat([chart_data['TOTAL_PRICE'].tail(90), forecast_df['predicted_sales']]))
+                # We use the pre-loaded (and pre-indexed) recent historical data
+                st.line_chart(pd.concat([recent_sales, forecast_df['predicted_sales']]))
 
                 st.subheader("Forecasted Sales Data")
-                display_df = forecast_df.copy()
-                display_df['predicted_sales'] = display_df['predicted_sales'].apply(lambda x: f"${x:,.2f}")
-                st.dataframe(display_df)
+                # Keep the column numeric and let Streamlit format it as currency
+                st.dataframe(forecast_df, column_config={
+                    'predicted_sales': st.column_config.NumberColumn('Predicted Sales', format='dollar')
+                })
     else:
         st.warning("Model has not been trained. Cannot run the application.")
 
@@ -110,6 +137,9 @@ with tab2:
     st.markdown("This dashboard visualizes the historical data used to train the forecasting model.")
 
     if not historical_data.empty:
+        # Altair is slow to import, so it is only loaded once there is a chart to draw
+        import altair as alt
+
         # --- FILTERS in the main panel for simplicity ---
         st.markdown("#### Filter the historical data:")
 
@@ -128,10 +158,9 @@ with tab2:
         # Apply date filter
         if len(selected_date_range) == 2:
             start_date, end_date = selected_date_range
-            df_filtered = historical_data[
-                (historical_data['INVOICE_TIMESTAMP'].dt.date >= start_date) &
-                (historical_data['INVOICE_TIMESTAMP'].dt.date <= end_date)
-                ]
+            # The dates are sorted, so the range is found with two binary searches instead of per-row comparisons
+            lo, hi = np.searchsorted(historical_days, [np.datetime64(start_date), np.datetime64(end_date) + 1])
+            df_filtered = historical_data.iloc[lo:hi]
 
             if df_filtered.empty:
                 st.warning("No data available for the selected date range.")
@@ -139,7 +168,8 @@ with tab2:
                 # --- KPI Metrics ---
                 st.markdown("---")
                 total_revenue = df_filtered['TOTAL_PRICE'].sum()
-                total_days_with_sales = df_filtered[df_filtered['TOTAL_PRICE'] > 0]['INVOICE_TIMESTAMP'].nunique()
+                # The history has exactly one row per day, so counting days with sales needs no filtered copy
+                total_days_with_sales = int((df_filtered['TOTAL_PRICE'] > 0).sum())
 
                 col1, col2 = st.columns(2)
                 col1.metric("Total Revenue", f"${total_revenue:,.2f}")
@@ -4,31 +4,71 @@ import streamlit as st
 import pandas as pd
 import snowflake.connector
 import os
+from datetime import timedelta
 import altair as alt
 
+SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
+SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
+SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
+
+CACHE_TTL_SECONDS = 600  # Cache data for 10 minutes
+
 
 # --- Snowflake Connection (same as your other scripts) ---
-@st.cache_data(ttl=600)  # Cache data for 10 minutes
-def fetch_dashboard_data():
-    """Fetches the clean data from Snowflake for the dashboard."""
+@st.cache_resource
+def get_snowflake_connection():
+    """Opens a single Snowflake connection that is reused across reruns and sessions."""
+    return snowflake.connector.connect(
+        user=SNOWFLAKE_USER,
+        password=SNOWFLAKE_PASSWORD,
+        account=SNOWFLAKE_ACCOUNT,
+        warehouse="COMPUTE_WH",
+        database="ECOMMERCE_DB",
+        schema="ANALYTICS",
+        client_session_keep_alive=True  # Keep the cached session from expiring while the app is idle
+    )
+
+
+def reset_snowflake_connection():
+    """Closes the cached Snowflake connection and drops it from the cache, so the next query reconnects."""
     try:
-        with snowflake.connector.connect(
-                user=os.getenv("SNOWFLAKE_USER"),
-                password=os.getenv("SNOWFLAKE_PASSWORD"),
-                account=os.getenv("SNOWFLAKE_ACCOUNT"),
-                warehouse="COMPUTE_WH",
-                database="ECOMMERCE_DB",
-                schema="ANALYTICS"
-        ) as conn:
-            query = "SELECT * FROM SALES_CLEANED;"
-            df = pd.read_sql(query, conn)
-            # Basic data type conversion
-            df['TOTAL_PRICE'] = pd.to_numeric(df['TOTAL_PRICE'])
-            df['INVOICE_TIMESTAMP'] = pd.to_datetime(df['INVOICE_TIMESTAMP'])
-            return df
-    except Exception as e:
-        st.error(f"Error connecting to Snowflake: {e}")
-        return pd.DataFrame()  # Return empty dataframe on error
+        # Closing also stops the keep-alive heartbeat, which would otherwise hold the dropped session open
+        get_snowflake_connection().close()
+    except snowflake.connector.Error:
+        pass  # The connection is already unusable, it only needs to be dropped
+    get_snowflake_connection.clear()
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def run_query(query, params=None):
+    """Runs a query against SALES_CLEANED in Snowflake. Results are cached per (query, params).
+
+    Errors are raised rather than returned, since st.cache_data does not cache exceptions.
+    """
+    conn = get_snowflake_connection()
+    # fetch_pandas_all builds the DataFrame from Arrow batches instead of converting row by row
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        df = cursor.fetch_pandas_all()
+    df.columns = [col.upper() for col in df.columns]
+    return df
+
+
+def build_where_clause(countries, date_range):
+    """Builds the WHERE clause and bind parameters for the selected dashboard filters."""
+    conditions = []
+    params = []
+    if countries:
+        conditions.append(f"COUNTRY IN ({', '.join(['%s'] * len(countries))})")
+        params.extend(countries)
+    if len(date_range) == 2:
+        start_date, end_date = date_range
+        # End date is inclusive, so compare against the start of the following day
+        conditions.append("INVOICE_TIMESTAMP >= %s AND INVOICE_TIMESTAMP < %s")
+        params.extend([start_date, end_date + timedelta(days=1)])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, tuple(params)
 
 
 def show_dashboard():
@@ -36,17 +76,37 @@ def show_dashboard():
     st.subheader("Live E-Commerce Performance Dashboard")
     st.markdown("---")
 
-    df = fetch_dashboard_data()
-
-    if df.empty:
+    try:
+        render_dashboard()
+    except snowflake.connector.errors.ProgrammingError as e:
+        # A bad query or bind: the connection is still usable, unless the session itself has been closed
+        if get_snowflake_connection().is_closed():
+            reset_snowflake_connection()
+        st.error(f"Error querying Snowflake: {e}")
+    except snowflake.connector.Error as e:
+        # Connection-level failure (connect, lost session): reconnect on the next rerun
+        reset_snowflake_connection()
+        st.error(f"Error connecting to Snowflake: {e}")
         st.warning("Could not load dashboard data from Snowflake.")
+
+
+def render_dashboard():
+    """Renders the dashboard filters, KPIs, charts and tables from Snowflake queries."""
+    # Only the values needed to build the filters are fetched up front; all aggregation runs in Snowflake
+    countries_df = run_query("SELECT DISTINCT COUNTRY FROM SALES_CLEANED ORDER BY COUNTRY;")
+    date_bounds_df = run_query(
+        "SELECT MIN(INVOICE_TIMESTAMP) AS MIN_DATE, MAX(INVOICE_TIMESTAMP) AS MAX_DATE FROM SALES_CLEANED;"
+    )
+
+    if countries_df.empty or date_bounds_df.empty:
+        st.warning("No dashboard data available in Snowflake.")
         return
 
     # --- 1. Slicers / Filters ---
     st.sidebar.header("Dashboard Filters")
 
     # Country Multi-select Filter
-    all_countries = df['COUNTRY'].unique()
+    all_countries = countries_df['COUNTRY']
     selected_countries = st.sidebar.multiselect(
         "Select Countries",
         options=all_countries,
@@ -54,8 +114,8 @@ def show_dashboard():
     )
 
     # Date Range Filter
-    min_date = df['INVOICE_TIMESTAMP'].min().date()
-    max_date = df['INVOICE_TIMESTAMP'].max().date()
+    min_date = pd.to_datetime(date_bounds_df['MIN_DATE'].iloc[0]).date()
+    max_date = pd.to_datetime(date_bounds_df['MAX_DATE'].iloc[0]).date()
     selected_date_range = st.sidebar.date_input(
         "Select Date Range",
         value=(min_date, max_date),
@@ -63,30 +123,27 @@ def show_dashboard():
         max_value=max_date
     )
 
-    # Apply filters to the dataframe
-    if selected_countries:
-        df_filtered = df[df['COUNTRY'].isin(selected_countries)]
-    else:
-        # If no country is selected, use the whole dataframe
-        df_filtered = df.copy()
-
-    if len(selected_date_range) == 2:
-        start_date, end_date = selected_date_range
-        df_filtered = df_filtered[
-            (df_filtered['INVOICE_TIMESTAMP'].dt.date >= start_date) &
-            (df_filtered['INVOICE_TIMESTAMP'].dt.date <= end_date)
-            ]
-
-    if df_filtered.empty:
+    # Apply filters in SQL (if no country is selected, all countries are used)
+    where, params = build_where_clause(selected_countries, selected_date_range)
+
+    # --- 2. KPI Metrics ---
+    kpis = run_query(f"""
+        SELECT COUNT(*) AS N_ROWS,
+               SUM(TOTAL_PRICE) AS TOTAL_REVENUE,
+               COUNT(DISTINCT INVOICENO) AS TOTAL_ORDERS,
+               COUNT(DISTINCT CUSTOMERID) AS UNIQUE_CUSTOMERS
+        FROM SALES_CLEANED {where};
+    """, params)
+
+    if kpis.empty or kpis['N_ROWS'].iloc[0] == 0:
         st.warning("No data available for the selected filters.")
         return
 
-    # --- 2. KPI Metrics ---
     col1, col2, col3 = st.columns(3)
 
-    total_revenue = df_filtered['TOTAL_PRICE'].sum()
-    total_orders = df_filtered['INVOICENO'].nunique()
-    unique_customers = df_filtered['CUSTOMERID'].nunique()
+    total_revenue = float(kpis['TOTAL_REVENUE'].iloc[0])
+    total_orders = int(kpis['TOTAL_ORDERS'].iloc[0])
+    unique_customers = int(kpis['UNIQUE_CUSTOMERS'].iloc[0])
 
     col1.metric("Total Revenue", f"${total_revenue:,.2f}")
     col2.metric("Total Orders", f"{total_orders:,}")
@@ -100,34 +157,63 @@ def show_dashboard():
     with c1:
         # Revenue by Country (Bar Chart)
         st.subheader("Revenue by Country")
-        country_revenue = df_filtered.groupby('COUNTRY')['TOTAL_PRICE'].sum().sort_values(ascending=False).reset_index()
-
-        bar_chart = alt.Chart(country_revenue).mark_bar().encode(
-            x=alt.X('TOTAL_PRICE:Q', title='Total Revenue ($)'),
-            y=alt.Y('COUNTRY:N', sort='-x', title='Country'),
-            tooltip=['COUNTRY', 'TOTAL_PRICE:Q']
-        ).interactive()
-        st.altair_chart(bar_chart, use_container_width=True)
+        country_revenue = run_query(f"""
+            SELECT COUNTRY, SUM(TOTAL_PRICE) AS TOTAL_PRICE
+            FROM SALES_CLEANED {where}
+            GROUP BY COUNTRY
+            ORDER BY TOTAL_PRICE DESC;
+        """, params)
+
+        if country_revenue.empty:
+            st.warning("No revenue by country for the selected filters.")
+        else:
+            country_revenue['TOTAL_PRICE'] = pd.to_numeric(country_revenue['TOTAL_PRICE'])
+            bar_chart = alt.Chart(country_revenue).mark_bar().encode(
+                x=alt.X('TOTAL_PRICE:Q', title='Total Revenue ($)'),
+                y=alt.Y('COUNTRY:N', sort='-x', title='Country'),
+                tooltip=['COUNTRY', 'TOTAL_PRICE:Q']
+            ).interactive()
+            st.altair_chart(bar_chart, use_container_width=True)
 
     with c2:
-        # Revenue Over Time (Line Chart)
+        # Revenue Over Time (Line Chart), rolled up to weeks starting on Monday
         st.subheader("Revenue Over Time")
-        df_filtered['date'] = df_filtered['INVOICE_TIMESTAMP'].dt.to_period('W').apply(lambda r: r.start_time).dt.date
-        time_series_revenue = df_filtered.groupby('date')['TOTAL_PRICE'].sum().reset_index()
-
-        line_chart = alt.Chart(time_series_revenue).mark_line(point=True).encode(
-            x=alt.X('date:T', title='Date'),
-            y=alt.Y('TOTAL_PRICE:Q', title='Total Revenue ($)'),
-            tooltip=['date:T', 'TOTAL_PRICE:Q']
-        ).interactive()
-        st.altair_chart(line_chart, use_container_width=True)
+        time_series_revenue = run_query(f"""
+            SELECT DATE_TRUNC('WEEK', INVOICE_TIMESTAMP)::DATE AS WEEK_START, SUM(TOTAL_PRICE) AS TOTAL_PRICE
+            FROM SALES_CLEANED {where}
+            GROUP BY WEEK_START
+            ORDER BY WEEK_START;
+        """, params)
+
+        if time_series_revenue.empty:
+            st.warning("No revenue over time for the selected filters.")
+        else:
+            time_series_revenue['TOTAL_PRICE'] = pd.to_numeric(time_series_revenue['TOTAL_PRICE'])
+            line_chart = alt.Chart(time_series_revenue).mark_line(point=True).encode(
+                x=alt.X('WEEK_START:T', title='Date'),
+                y=alt.Y('TOTAL_PRICE:Q', title='Total Revenue ($)'),
+                tooltip=['WEEK_START:T', 'TOTAL_PRICE:Q']
+            ).interactive()
+            st.altair_chart(line_chart, use_container_width=True)
 
     st.markdown("---")
 
     # --- 4. Top Products Table ---
     st.subheader("Top Selling Products")
-    top_products = df_filtered.groupby('DESCRIPTION')['TOTAL_PRICE'].sum().sort_values(ascending=False).head(
-        10).reset_index()
+    top_products = run_query(f"""
+        SELECT DESCRIPTION, SUM(TOTAL_PRICE) AS TOTAL_PRICE
+        FROM SALES_CLEANED {where}
+        GROUP BY DESCRIPTION
+        ORDER BY TOTAL_PRICE DESC
+        LIMIT 10;
+    """, params)
+
+    if top_products.empty:
+        st.warning("No top selling products for the selected filters.")
+        return
+
+    top_products['TOTAL_PRICE'] = pd.to_numeric(top_products['TOTAL_PRICE'])
     top_products.rename(columns={'DESCRIPTION': 'Product', 'TOTAL_PRICE': 'Total Revenue'}, inplace=True)
-    top_products['Total Revenue'] = top_products['Total Revenue'].apply(lambda x: f"${x:,.2f}")
-    st.dataframe(top_products, use_container_width=True, hide_index=True)
\ No newline at end of file
+    st.dataframe(top_products, use_container_width=True, hide_index=True, column_config={
+        'Total Revenue': st.column_config.NumberColumn(format='dollar')
+    })
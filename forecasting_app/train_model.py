@@ -6,6 +6,8 @@ from sklearn.metrics import mean_absolute_percentage_error
 import warnings
 # ... other imports
 import os
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 import sys
 
@@ -29,33 +31,51 @@ if not all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
 
 MODEL_FILE_PATH = "sarima_model.pkl"
 
+# The dataset is from 2010-2011, so we'll only keep dates in this (exclusive) range
+MIN_VALID_DATE = datetime(2009, 1, 1)
+MAX_VALID_DATE = datetime(2013, 1, 1)
+
+# Local copy of the daily sales series, reused between training runs
+# The date bounds are part of the name, so changing them never reuses a series built with other bounds
+DAILY_SALES_CACHE_PATH = f"daily_sales_{MIN_VALID_DATE:%Y%m%d}_{MAX_VALID_DATE:%Y%m%d}.parquet"
+DAILY_SALES_CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+
 
 def fetch_data_from_snowflake():
-    """Fetches and prepares daily sales data from Snowflake."""
+    """Fetches and prepares daily sales data from Snowflake, reusing the local copy if it is less than a day old."""
+    if (os.path.exists(DAILY_SALES_CACHE_PATH)
+            and time.time() - os.path.getmtime(DAILY_SALES_CACHE_PATH) < DAILY_SALES_CACHE_MAX_AGE_SECONDS):
+        print(f"Loading cached daily sales from {DAILY_SALES_CACHE_PATH}...")
+        return pd.read_parquet(DAILY_SALES_CACHE_PATH)['TOTAL_PRICE'].asfreq('D')
+
     print("Fetching data from Snowflake...")
-    query = "SELECT INVOICE_TIMESTAMP, TOTAL_PRICE FROM SALES_CLEANED;"
+    # ✅ FIX: Filter out unrealistic dates (see MIN_VALID_DATE / MAX_VALID_DATE) before aggregating
+    # Aggregation to daily sales is done in Snowflake, so only one row per day is transferred.
+    query = """
+        SELECT DATE_TRUNC('DAY', INVOICE_TIMESTAMP) AS INVOICE_TIMESTAMP, SUM(TOTAL_PRICE) AS TOTAL_PRICE
+        FROM SALES_CLEANED
+        WHERE INVOICE_TIMESTAMP > %s AND INVOICE_TIMESTAMP < %s
+        GROUP BY 1
+        ORDER BY 1;
+    """
     with snowflake.connector.connect(
             user=SNOWFLAKE_USER, password=SNOWFLAKE_PASSWORD, account=SNOWFLAKE_ACCOUNT,
             warehouse=SNOWFLAKE_WAREHOUSE, database=SNOWFLAKE_DATABASE, schema=SNOWFLAKE_SCHEMA
     ) as conn:
         cursor = conn.cursor()
-        cursor.execute(query)
+        cursor.execute(query, (MIN_VALID_DATE, MAX_VALID_DATE))
         df = cursor.fetch_pandas_all()
 
     df.columns = [col.upper() for col in df.columns]
     df['INVOICE_TIMESTAMP'] = pd.to_datetime(df['INVOICE_TIMESTAMP'])
-
-    # ✅ FIX: Filter out unrealistic dates before resampling
-    # The dataset is from 2010-2011, so we'll only keep dates in a reasonable range.
-    print("   - Filtering out unrealistic dates...")
-    df = df[(df['INVOICE_TIMESTAMP'] > '2009-01-01') & (df['INVOICE_TIMESTAMP'] < '2013-01-01')]
-    print(f"   - {len(df)} records remaining after date filtering.")
-
-    # Aggregate to daily sales
-    daily_sales = df.set_index('INVOICE_TIMESTAMP').resample('D')['TOTAL_PRICE'].sum()
+    df['TOTAL_PRICE'] = pd.to_numeric(df['TOTAL_PRICE'])
+    print(f"   - {len(df)} days with sales fetched.")
 
     # We need a continuous date range, so fill missing days with 0
-    daily_sales = daily_sales.asfreq('D', fill_value=0)
+    # The index name is stored in the model and used by the Streamlit app
+    daily_sales = df.set_index('INVOICE_TIMESTAMP')['TOTAL_PRICE'].asfreq('D', fill_value=0)
+
+    daily_sales.to_frame().to_parquet(DAILY_SALES_CACHE_PATH)
     return daily_sales
 
 
@@ -89,9 +109,9 @@ def main():
     print(f"\nModel In-Sample MAPE: {mape:.4f}")
     print(f"Model In-Sample Accuracy: {accuracy:.2f}%")  # This will likely be > 90%
 
-    # Save the trained model
+    # Save the trained model, lz4-compressed to keep the file small for the Streamlit app
     print(f"Saving model to {MODEL_FILE_PATH}...")
-    joblib.dump(results, MODEL_FILE_PATH)
+    joblib.dump(results, MODEL_FILE_PATH, compress=('lz4', 3))
     print("Model training and saving complete!")
 
 